@@ -8,7 +8,8 @@ import os
 from flask import Flask
 
 from .config import Config
-from .routes import bp, init_image_service
+from .image_service import get_image_service, init_image_service, _json_dumps
+from .routes import bp, debug
 
 
 def create_app() -> Flask:
@@ -28,14 +29,31 @@ def create_app() -> Flask:
     config = Config.from_env()
     app.config.from_object(config)
 
+    # Pre-serialize the client config; it only changes on restart
+    app.config['_CONFIG_JSON'] = _json_dumps({
+        'delay': config.PHOTO_DELAY_SECONDS * 1000,
+        'fadeDuration': config.FADE_DURATION_MS,
+        'displayOrder': config.DISPLAY_ORDER
+    })
+
     # Initialize image service with config
     init_image_service(
         config.PHOTO_DIRS,
         config.CACHE_DIR,
-        config.ENABLE_CACHE
+        config.ENABLE_CACHE,
+        config.JPEG_QUALITY
     )
 
     # Register blueprint
     app.register_blueprint(bp)
 
+    # The debug endpoint reflects the raw API key; keep it out of the
+    # URL map entirely in production
+    if config.DEBUG:
+        app.add_url_rule('/debug', 'debug', debug)
+
+    # Optionally warm the transcode/blur cache in the background
+    if config.PREWARM_CACHE:
+        get_image_service().start_prewarm(app)
+
     return app
@@ -5,10 +5,16 @@ API key can be provided via:
 - Query parameter: ?api_key=your-key
 - Request header: X-API-Key: your-key
 """
+import hmac
 import os
 from functools import wraps
+from typing import Optional
 from flask import request, jsonify, current_app
 
+# Expected API key (encoded once), cached on first use to skip the
+# config-proxy lookup on every request. The config only changes on restart.
+_cached_key: Optional[bytes] = None
+
 
 def require_api_key(f):
     """
@@ -26,6 +32,8 @@ def require_api_key(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        global _cached_key
+
         # Check query parameter first
         api_key = request.args.get('api_key')
 
@@ -34,9 +42,13 @@ def require_api_key(f):
             api_key = request.headers.get('X-API-Key')
 
         # Get configured API key from app config
-        expected_key = current_app.config.get('API_KEY', 'change-me')
+        expected_key = _cached_key
+        if expected_key is None:
+            expected_key = current_app.config.get('API_KEY', 'change-me').encode()
+            _cached_key = expected_key
 
-        if not api_key or api_key != expected_key:
+        # Compare as bytes: compare_digest rejects non-ASCII strings
+        if not api_key or not hmac.compare_digest(api_key.encode(), expected_key):
             return jsonify({
                 'error': 'Invalid or missing API key',
                 'message': 'Provide API key via ?api_key= parameter or X-API-Key header'
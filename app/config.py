@@ -28,6 +28,14 @@ class Config:
     # Cache settings
     CACHE_DIR: str = '/tmp/picture-frame-cache'
     ENABLE_CACHE: bool = True
+    PREWARM_CACHE: bool = False
+
+    # JPEG quality for transcoded images
+    JPEG_QUALITY: int = 90
+
+    # Reverse-proxy file serving offload
+    USE_X_SENDFILE: bool = False
+    X_ACCEL_REDIRECT_PREFIX: str = ''
 
     def __post_init__(self):
         """Validate and normalize configuration after initialization."""
@@ -55,4 +63,8 @@ class Config:
             FADE_DURATION_MS=int(os.getenv('FADE_DURATION_MS', '1000')),
             CACHE_DIR=os.getenv('CACHE_DIR', '/tmp/picture-frame-cache'),
             ENABLE_CACHE=os.getenv('ENABLE_CACHE', 'true').lower() == 'true',
+            PREWARM_CACHE=os.getenv('PREWARM_CACHE', 'false').lower() == 'true',
+            JPEG_QUALITY=int(os.getenv('JPEG_QUALITY', '90')),
+            USE_X_SENDFILE=os.getenv('USE_X_SENDFILE', 'false').lower() == 'true',
+            X_ACCEL_REDIRECT_PREFIX=os.getenv('X_ACCEL_REDIRECT_PREFIX', ''),
         )
@@ -4,13 +4,15 @@ Image service for Picture Frame application.
 Handles photo scanning from local directories, HEIC to JPEG transcoding,
 and caching of transcoded images.
 """
-import hashlib
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Tuple, Optional
 
 from flask import current_app, send_file
 from PIL import Image, ImageFilter
+import xxhash
 
 try:
     import pillow_heif
@@ -19,11 +21,37 @@ try:
 except ImportError:
     HEIC_SUPPORT = False
 
-# Supported image formats
-SUPPORTED_FORMATS = {'.jpg', '.jpeg', '.png', '.heic', '.heif'}
+try:
+    import orjson
+
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+    _json_loads = json.loads
+
+# Supported image formats (lowercase extensions, without the dot)
+SUPPORTED_FORMATS = frozenset({'jpg', 'jpeg', 'png', 'heic', 'heif'})
 
 # Formats that need transcoding for iOS 5.1.1 compatibility
-TRANSCODE_FORMATS = {'.heic', '.heif'}
+TRANSCODE_FORMATS = frozenset({'heic', 'heif'})
+
+# Largest dimension worth serving; the target iPad 1 screen is 1024x768
+MAX_DISPLAY_SIZE = (1024, 1024)
+
+# Cache layout version. Bumped when the cache naming scheme changes
+# (v2: path hashes switched from MD5 to xxh3) so stale files aren't served.
+CACHE_VERSION = 'v2'
+
+# Persisted scan file format; bumped when the photo dict fields change
+# so older workers' scan files aren't loaded with fields missing.
+SCAN_FORMAT = 2
 
 
 class ImageService:
@@ -34,7 +62,8 @@ class ImageService:
     transcoding of HEIC files to JPEG for compatibility with older browsers.
     """
 
-    def __init__(self, photo_dirs: List[str], cache_dir: str, enable_cache: bool = True):
+    def __init__(self, photo_dirs: List[str], cache_dir: str, enable_cache: bool = True,
+                 jpeg_quality: int = 90):
         """
         Initialize the image service.
 
@@ -42,10 +71,15 @@ class ImageService:
             photo_dirs: List of directory paths to scan for photos
             cache_dir: Directory for caching transcoded images
             enable_cache: Whether to enable caching of transcoded images
+            jpeg_quality: JPEG quality for transcoded images
         """
         self.photo_dirs = [Path(d) for d in photo_dirs]
-        self.cache_dir = Path(cache_dir)
+        self.cache_dir = Path(cache_dir) / CACHE_VERSION
         self.enable_cache = enable_cache
+        self.jpeg_quality = jpeg_quality
+        # Cached scan result: (dir_mtimes, photos, id_index, public_photos).
+        # Invalidated whenever any photo directory's mtime changes.
+        self._scan_cache: Optional[tuple] = None
         self._ensure_cache_dir()
 
     def _ensure_cache_dir(self):
@@ -57,60 +91,75 @@ class ImageService:
                 current_app.logger.warning(f'Failed to create cache directory: {e}')
                 self.enable_cache = False
 
-    def _get_cache_path(self, image_path: Path) -> Path:
+    def _get_cache_path(self, path_hash: str) -> Path:
         """
         Generate a cache path for a transcoded image.
 
-        Uses MD5 hash of the original path to avoid filename collisions.
+        Uses the photo's precomputed path hash (from scan_photos) to avoid
+        filename collisions without re-hashing the path.
 
         Args:
-            image_path: Original image path
+            path_hash: Hex digest of the original image path
 
         Returns:
             Path where transcoded image should be cached
         """
-        path_hash = hashlib.md5(str(image_path).encode()).hexdigest()
         return self.cache_dir / f'{path_hash}.jpg'
 
-    def _transcode_heic(self, heic_path: Path) -> Optional[Path]:
+    def _transcode_heic(self, photo: dict) -> Optional[Path]:
         """
         Transcode HEIC/HEIF image to JPEG.
 
         Args:
-            heic_path: Path to the HEIC/HEIF file
+            photo: Photo dictionary from scan_photos()
 
         Returns:
             Path to transcoded JPEG file, or None if transcoding failed
         """
+        heic_path = Path(photo['path'])
+
         if not HEIC_SUPPORT:
             current_app.logger.error(f'HEIC support not available, cannot transcode {heic_path}')
             return None
 
-        cache_path = self._get_cache_path(heic_path)
+        cache_path = self._get_cache_path(photo['_path_hash'])
 
-        # Check cache first
-        if self.enable_cache and cache_path.exists():
-            # Verify cache is newer than source
-            if cache_path.stat().st_mtime > heic_path.stat().st_mtime:
-                return cache_path
+        # Check cache first; the source mtime was recorded at scan time,
+        # so only the cache file needs a stat here
+        if self.enable_cache:
+            try:
+                if cache_path.stat().st_mtime > photo['_mtime']:
+                    return cache_path
+            except OSError:
+                pass
 
         try:
-            with Image.open(heic_path) as img:
-                # Convert to RGB if needed (HEIC might have alpha channel)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
+            # Decode via pillow_heif directly, skipping the Pillow plugin
+            # registration round-trip
+            heif = pillow_heif.open_heif(str(heic_path), convert_hdr_to_8bit=True)
+            img = heif.to_pillow()
+
+            # Convert to RGB if needed (HEIC might have alpha channel)
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            # Downscale to display size; the client can't show more pixels
+            img.thumbnail(MAX_DISPLAY_SIZE, Image.LANCZOS)
 
-                # Save as JPEG with high quality
-                img.save(cache_path, 'JPEG', quality=95, optimize=True)
+            # Save as JPEG; skip the optimize pass, which costs a large
+            # share of encode time for a few percent of file size
+            img.save(cache_path, 'JPEG', quality=self.jpeg_quality,
+                     optimize=False, progressive=False)
 
-            current_app.logger.debug(f'Transcoded {heic_path} to {cache_path}')
+            # Lazy %-formatting: only evaluated when DEBUG logging is on
+            current_app.logger.debug('Transcoded %s to %s', heic_path, cache_path)
             return cache_path
 
         except Exception as e:
             current_app.logger.error(f'Failed to transcode {heic_path}: {e}')
             return None
 
-    def _generate_blurred_image(self, image_path: Path) -> Optional[Path]:
+    def _generate_blurred_image(self, image_path: Path, photo: dict) -> Optional[Path]:
         """
         Generate a blurred version of an image for background display.
 
@@ -118,18 +167,22 @@ class ImageService:
         of the image optimized for use as a background layer.
 
         Args:
-            image_path: Path to the original image
+            image_path: Path to the image to blur (original or transcoded)
+            photo: Photo dictionary from scan_photos()
 
         Returns:
             Path to cached blurred image, or None if generation failed
         """
-        # Use separate blur cache directory
-        blur_cache_path = self.cache_dir / 'blur' / self._get_cache_path(image_path).name
+        # Use separate blur cache directory, named by the photo's path hash
+        blur_cache_path = self.cache_dir / 'blur' / f"{photo['_path_hash']}.jpg"
 
-        # Check cache first
-        if self.enable_cache and blur_cache_path.exists():
-            if blur_cache_path.stat().st_mtime > image_path.stat().st_mtime:
-                return blur_cache_path
+        # Check cache first, against the source mtime recorded at scan time
+        if self.enable_cache:
+            try:
+                if blur_cache_path.stat().st_mtime > photo['_mtime']:
+                    return blur_cache_path
+            except OSError:
+                pass
 
         # Ensure blur cache subdirectory exists
         try:
@@ -147,30 +200,140 @@ class ImageService:
                 # Downscale for performance (max dimension 800px)
                 img.thumbnail((800, 800), Image.LANCZOS)
 
-                # Apply heavy blur
-                img = img.filter(ImageFilter.GaussianBlur(radius=30))
+                # Apply heavy blur. Three box passes approximate a Gaussian
+                # (radius 17 ~ sigma 30) but run in constant time per pixel
+                # regardless of radius, unlike GaussianBlur's wide kernel.
+                for _ in range(3):
+                    img = img.filter(ImageFilter.BoxBlur(radius=17))
 
                 # Save as JPEG with lower quality (background doesn't need high quality)
-                img.save(blur_cache_path, 'JPEG', quality=70, optimize=True)
+                img.save(blur_cache_path, 'JPEG', quality=60,
+                         optimize=False, progressive=False)
 
-                current_app.logger.debug(f'Generated blurred image for {image_path}')
+                # Lazy %-formatting: only evaluated when DEBUG logging is on
+                current_app.logger.debug('Generated blurred image for %s', image_path)
                 return blur_cache_path
 
         except Exception as e:
             current_app.logger.error(f'Failed to generate blur for {image_path}: {e}')
             return None
 
+    def _collect_dir_mtimes(self) -> tuple:
+        """
+        Stat each photo directory and its subdirectories.
+
+        The resulting (path, mtime_ns) pairs serve as the validity key for
+        the scan cache: adding, removing or renaming a file updates the
+        containing directory's mtime, so any change invalidates the cache.
+
+        Returns:
+            Tuple of (path, mtime_ns) pairs for every directory found
+        """
+        mtimes = []
+        stack = [str(d) for d in self.photo_dirs]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                stat = os.stat(dir_path)
+            except OSError:
+                continue
+            mtimes.append((dir_path, stat.st_mtime_ns))
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except OSError:
+                continue
+        return tuple(mtimes)
+
+    def _walk(self, root: Path):
+        """
+        Recursively yield file entries under a directory using os.scandir.
+
+        DirEntry objects carry the file type from the directory listing,
+        avoiding the second stat call per entry that Path.rglob() plus
+        is_file() would incur.
+
+        Args:
+            root: Directory to walk
+
+        Yields:
+            os.DirEntry objects for regular files
+        """
+        stack = [os.path.abspath(str(root))]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file():
+                            yield entry
+            except OSError as e:
+                current_app.logger.warning(f'Failed to scan directory {dir_path}: {e}')
+
+    def _ensure_scan(self) -> tuple:
+        """
+        Validate the scan cache against directory mtimes, rebuilding if stale.
+
+        Returns:
+            The current scan cache tuple
+        """
+        dir_mtimes = self._collect_dir_mtimes()
+        if self._scan_cache is not None and self._scan_cache[0] == dir_mtimes:
+            return self._scan_cache
+        # Prefer a scan persisted by another worker process over re-walking
+        if not self._load_persisted_scan(dir_mtimes):
+            self._scan_photo_dirs(dir_mtimes)
+        return self._scan_cache
+
     def scan_photos(self, order: str = 'random') -> List[dict]:
         """
         Scan photo directories and return list of available photos.
 
+        The scan result is cached keyed by directory mtimes, so repeated
+        calls only re-walk the filesystem after a directory has changed.
+        The cached list is sorted by path, which is the sequential order;
+        random ordering is applied by the caller.
+
         Args:
             order: 'random' or 'sequential' - determines photo order
 
+        Returns:
+            List of photo dictionaries with metadata
+        """
+        # Return a copy so callers can shuffle without touching the cache
+        return list(self._ensure_scan()[1])
+
+    def get_public_photos(self) -> List[dict]:
+        """
+        Get the cached client-facing photo list.
+
+        Each entry carries only the fields exposed by the API (id, name,
+        is_heic, url), built once at scan time so request handlers don't
+        rebuild dicts per call. The returned list is the cache itself and
+        must not be mutated.
+
+        Returns:
+            Path-sorted list of public photo dictionaries
+        """
+        return self._ensure_scan()[3]
+
+    def _scan_photo_dirs(self, dir_mtimes: tuple) -> List[dict]:
+        """
+        Walk the photo directories, rebuild the scan cache and return photos.
+
+        Args:
+            dir_mtimes: Directory mtimes tuple to store as the cache key
+
         Returns:
             List of photo dictionaries with metadata
         """
         photos = []
+        # Dedup only matters when multiple photo dirs could overlap
+        dedup = len(self.photo_dirs) > 1
         seen_paths = set()
 
         for photo_dir in self.photo_dirs:
@@ -183,20 +346,27 @@ class ImageService:
                 continue
 
             # Recursively find supported image files
-            for filepath in photo_dir.rglob('*'):
-                # Skip if not a file or extension not supported
-                if not filepath.is_file():
+            for entry in self._walk(photo_dir):
+                # Cheap extension check before building any Path objects;
+                # dot <= 0 also skips dotfiles, matching Path.suffix
+                name = entry.name
+                dot = name.rfind('.')
+                if dot <= 0:
                     continue
-
-                ext = filepath.suffix.lower()
+                ext = name[dot + 1:].lower()
                 if ext not in SUPPORTED_FORMATS:
                     continue
 
-                # Use full path as unique identifier
-                full_path = str(filepath.resolve())
-                if full_path in seen_paths:
-                    continue
-                seen_paths.add(full_path)
+                # Use full path as unique identifier. scandir paths are
+                # already absolute; resolve only actual symlinks.
+                if entry.is_symlink():
+                    full_path = os.path.realpath(entry.path)
+                else:
+                    full_path = entry.path
+                if dedup:
+                    if full_path in seen_paths:
+                        continue
+                    seen_paths.add(full_path)
 
                 # Determine if transcoding needed
                 is_heic = ext in TRANSCODE_FORMATS
@@ -204,41 +374,133 @@ class ImageService:
                 # Create relative URL path
                 # Use filename as identifier, but need to handle duplicates
                 # Use hash of full path for unique identifier
-                path_hash = hashlib.md5(full_path.encode()).hexdigest()[:12]
-                display_name = filepath.stem
+                path_hash = xxhash.xxh3_128(full_path.encode()).hexdigest()
+                display_name = name[:dot]
 
-                photos.append({
-                    'id': f'{display_name}_{path_hash}',
+                photo = {
+                    'id': f'{display_name}_{path_hash[:12]}',
                     'name': display_name,
                     'path': full_path,
                     'is_heic': is_heic,
-                    'url': f'/api/photo/{path_hash}'
-                })
+                    # MIME type as served; HEIC is transcoded to JPEG
+                    'mimetype': 'image/png' if ext == 'png' else 'image/jpeg',
+                    'url': f'/api/photo/{path_hash[:12]}',
+                    # Full hash, reused for cache file naming
+                    '_path_hash': path_hash,
+                    # Source mtime, reused for cache validity checks
+                    # (scandir has already fetched the stat result)
+                    '_mtime': entry.stat().st_mtime
+                }
+                photos.append(photo)
+
+        self._set_scan_cache(dir_mtimes, photos)
+        self._persist_scan(dir_mtimes, photos)
+        return photos
 
-        # Sort by path for sequential order
-        if order == 'sequential':
-            photos.sort(key=lambda p: p['path'])
-        # For random, we shuffle in the frontend or can do here
-        # Doing it here allows persistent shuffle for the session
+    def _set_scan_cache(self, dir_mtimes: tuple, photos: List[dict]):
+        """
+        Derive the lookup structures from a photo list and store the cache.
 
-        return photos
+        Args:
+            dir_mtimes: Directory mtimes tuple to store as the cache key
+            photos: Photo dictionaries from a walk or the persisted scan
+        """
+        # Path order is the sequential display order; sorting here lets
+        # the cached lists be served as-is
+        photos.sort(key=lambda p: p['path'])
+
+        id_index = {p['_path_hash'][:12]: p for p in photos}
+
+        # Client-facing projection, built once so request handlers can
+        # serialize it without copying
+        public_photos = [
+            {'id': p['id'], 'name': p['name'], 'is_heic': p['is_heic'], 'url': p['url']}
+            for p in photos
+        ]
+
+        self._scan_cache = (dir_mtimes, photos, id_index, public_photos)
+
+    def _scan_file_path(self) -> Path:
+        """Path of the persisted scan file shared between workers."""
+        return self.cache_dir / 'scan.json'
+
+    def _load_persisted_scan(self, dir_mtimes: tuple) -> bool:
+        """
+        Try to populate the scan cache from the persisted scan file.
+
+        Under a multi-worker server each process would otherwise re-walk
+        every photo directory on its first request; this lets later
+        workers reuse the scan written by the first one, as long as the
+        recorded directory mtimes still match.
+
+        Args:
+            dir_mtimes: Current directory mtimes the file must match
+
+        Returns:
+            True if the cache was populated from the file
+        """
+        if not self.enable_cache:
+            return False
+
+        try:
+            data = _json_loads(self._scan_file_path().read_bytes())
+        except (OSError, ValueError):
+            return False
+
+        if data.get('format') != SCAN_FORMAT:
+            return False
+
+        # JSON turns the mtime pairs into lists; normalize before comparing
+        if tuple(tuple(m) for m in data.get('mtimes', ())) != dir_mtimes:
+            return False
+
+        self._set_scan_cache(dir_mtimes, data.get('photos', []))
+        return True
+
+    def _persist_scan(self, dir_mtimes: tuple, photos: List[dict]):
+        """
+        Write the scan result so other worker processes can load it.
+
+        Args:
+            dir_mtimes: Directory mtimes tuple recorded as the validity key
+            photos: Photo dictionaries to persist
+        """
+        if not self.enable_cache:
+            return
+
+        scan_file = self._scan_file_path()
+        tmp_file = scan_file.with_suffix('.json.tmp')
+        try:
+            tmp_file.write_bytes(_json_dumps({
+                'format': SCAN_FORMAT,
+                'mtimes': [list(m) for m in dir_mtimes],
+                'photos': photos
+            }))
+            # Atomic replace so readers never see a partial file
+            os.replace(tmp_file, scan_file)
+        except OSError as e:
+            current_app.logger.warning(f'Failed to persist scan cache: {e}')
 
     def get_photo_by_id(self, photo_id: str) -> Optional[dict]:
         """
         Find a photo by its ID.
 
+        Looks the photo up in the hash index built by scan_photos(),
+        so this is a dict lookup rather than a scan of the library.
+
         Args:
             photo_id: Photo identifier (hash suffix)
 
         Returns:
             Photo dict or None if not found
         """
-        photos = self.scan_photos()
-        for photo in photos:
-            # Match by hash suffix (last 12 chars of the id)
-            if photo['id'].endswith(photo_id) or photo['id'] == photo_id:
-                return photo
-        return None
+        # Ensure the index exists and is up to date
+        id_index = self._ensure_scan()[2]
+        photo = id_index.get(photo_id)
+        if photo is None and '_' in photo_id:
+            # Tolerate callers passing the full id instead of the hash suffix
+            photo = id_index.get(photo_id.rsplit('_', 1)[1])
+        return photo
 
     def get_display_path(self, photo: dict, blur: bool = False) -> Optional[str]:
         """
@@ -255,35 +517,75 @@ class ImageService:
         Returns:
             Path to use for display, or None if processing failed
         """
-        photo_path = Path(photo['path'])
-
         # Handle blur request
         if blur:
             # For HEIC, we blur the transcoded version
             if photo['is_heic']:
-                transcoded = self._transcode_heic(photo_path)
+                transcoded = self._transcode_heic(photo)
                 if transcoded:
-                    return self._generate_blurred_image(transcoded)
+                    return self._generate_blurred_image(transcoded, photo)
             else:
-                return self._generate_blurred_image(photo_path)
+                return self._generate_blurred_image(Path(photo['path']), photo)
             return None
 
         # Normal display path
         if photo['is_heic']:
-            cached = self._transcode_heic(photo_path)
+            cached = self._transcode_heic(photo)
             if cached:
                 return str(cached)
             # Transcoding failed, return None
             return None
 
-        return str(photo_path)
+        return photo['path']
+
+    def start_prewarm(self, app):
+        """
+        Warm the transcode/blur cache in a background thread.
+
+        Scans the library and processes every photo through a thread pool,
+        so the first request to each photo hits a warm cache instead of
+        paying the decode cost. libheif and Pillow release the GIL during
+        decode/encode, so the pool overlaps work across cores.
+
+        Args:
+            app: Flask application, needed for an app context in workers
+        """
+        if not self.enable_cache:
+            return
+
+        def prewarm_one(photo):
+            with app.app_context():
+                self._prewarm(photo)
+
+        def run():
+            with app.app_context():
+                photos = self.scan_photos()
+            with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                for _ in executor.map(prewarm_one, photos):
+                    pass
+
+        threading.Thread(target=run, name='cache-prewarm', daemon=True).start()
+
+    def _prewarm(self, photo: dict):
+        """
+        Populate cache entries for a single photo.
+
+        Args:
+            photo: Photo dictionary from scan_photos()
+        """
+        try:
+            self.get_display_path(photo)
+            self.get_display_path(photo, blur=True)
+        except Exception as e:
+            current_app.logger.error(f'Failed to prewarm {photo["path"]}: {e}')
 
 
 # Global image service instance
 _image_service: Optional[ImageService] = None
 
 
-def init_image_service(photo_dirs: List[str], cache_dir: str, enable_cache: bool = True):
+def init_image_service(photo_dirs: List[str], cache_dir: str, enable_cache: bool = True,
+                       jpeg_quality: int = 90):
     """
     Initialize the global image service instance.
 
@@ -291,9 +593,10 @@ def init_image_service(photo_dirs: List[str], cache_dir: str, enable_cache: bool
         photo_dirs: List of directory paths to scan for photos
         cache_dir: Directory for caching transcoded images
         enable_cache: Whether to enable caching
+        jpeg_quality: JPEG quality for transcoded images
     """
     global _image_service
-    _image_service = ImageService(photo_dirs, cache_dir, enable_cache)
+    _image_service = ImageService(photo_dirs, cache_dir, enable_cache, jpeg_quality)
 
 
 def get_image_service() -> Optional[ImageService]:
@@ -4,14 +4,17 @@ HTTP routes for Picture Frame application.
 Provides API endpoints for photo listing, serving, and configuration.
 """
 import random
-from pathlib import Path
-from flask import Blueprint, render_template, jsonify, send_file, current_app, request
+from urllib.parse import quote
+from flask import Blueprint, Response, render_template, jsonify, send_file, current_app, request
 
 from .auth import require_api_key
-from .image_service import get_image_service, init_image_service
+from .image_service import get_image_service, _json_dumps
 
 bp = Blueprint('main', __name__)
 
+# Static health-check body, serialized once
+_HEALTH_RESPONSE = b'{"status":"ok"}'
+
 
 @bp.route('/')
 def index():
@@ -31,12 +34,11 @@ def get_config():
     Returns delay, fade duration, and display order settings.
     This endpoint does not require authentication as it only returns
     public display settings.
+
+    The body is pre-serialized in create_app() since it only changes
+    on restart.
     """
-    return jsonify({
-        'delay': current_app.config.get('PHOTO_DELAY_SECONDS', 10) * 1000,
-        'fadeDuration': current_app.config.get('FADE_DURATION_MS', 1000),
-        'displayOrder': current_app.config.get('DISPLAY_ORDER', 'random')
-    })
+    return Response(current_app.config['_CONFIG_JSON'], mimetype='application/json')
 
 
 @bp.route('/api/photos')
@@ -59,27 +61,24 @@ def list_photos():
         order = 'random'
 
     image_service = get_image_service()
-    photos = image_service.scan_photos(order=order)
 
-    # Shuffle if random order requested
-    if order == 'random':
-        random.shuffle(photos)
-
-    # Remove internal 'path' field from response
-    response_photos = [
-        {
-            'id': p['id'],
-            'name': p['name'],
-            'is_heic': p['is_heic'],
-            'url': p['url']
-        }
-        for p in photos
-    ]
+    # The cached public list already carries only the client-facing
+    # fields, in sequential (path) order
+    photos = image_service.get_public_photos()
 
-    return jsonify({
-        'photos': response_photos,
-        'count': len(response_photos)
-    })
+    # Shuffle if random order requested; sample leaves the cached list intact
+    if order == 'random':
+        response_photos = random.sample(photos, k=len(photos))
+    else:
+        response_photos = photos
+
+    return Response(
+        _json_dumps({
+            'photos': response_photos,
+            'count': len(response_photos)
+        }),
+        mimetype='application/json'
+    )
 
 
 @bp.route('/api/photo/<photo_id>')
@@ -115,28 +114,32 @@ def get_photo(photo_id):
     if display_path is None:
         return jsonify({'error': 'Failed to process photo'}), 500
 
-    # Determine MIME type (blur always returns JPEG)
-    if blur:
-        mimetype = 'image/jpeg'
-    elif photo['is_heic']:
-        mimetype = 'image/jpeg'
-    else:
-        # Get extension from original path
-        ext = Path(photo['path']).suffix.lower()
-        if ext in ('.jpg', '.jpeg'):
-            mimetype = 'image/jpeg'
-        elif ext == '.png':
-            mimetype = 'image/png'
-        else:
-            mimetype = 'image/jpeg'
+    # MIME type is precomputed at scan time; blur always returns JPEG
+    mimetype = 'image/jpeg' if blur else photo['mimetype']
 
     # Cache blur longer (24 hours vs 1 hour for normal)
     max_age = 86400 if blur else 3600
 
+    # Offload the file transfer to nginx when an internal location is
+    # configured; the response body is then served by the proxy directly
+    accel_prefix = current_app.config.get('X_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        response = Response(mimetype=mimetype)
+        # Percent-encode the path: header values must be latin-1 safe and
+        # nginx unescapes the redirect URI before routing it
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + quote(str(display_path))
+        response.headers['Cache-Control'] = f'public, max-age={max_age}'
+        # The path hash identifies the content variant, so it makes a
+        # stable ETag; make_conditional turns revalidations into 304s
+        response.set_etag(f"{photo['_path_hash']}-blur" if blur else photo['_path_hash'])
+        return response.make_conditional(request)
+
     return send_file(
         display_path,
         mimetype=mimetype,
-        max_age=max_age
+        max_age=max_age,
+        conditional=True,
+        etag=True
     )
 
 
@@ -148,13 +151,15 @@ def health():
     Returns:
         JSON with 'status': 'ok'
     """
-    return jsonify({'status': 'ok'})
+    return Response(_HEALTH_RESPONSE, mimetype='application/json')
 
 
-@bp.route('/debug')
 def debug():
     """
     Debug endpoint to see what API key is being received.
+
+    Not registered as a route here: create_app() only adds it when DEBUG
+    is enabled, since it reflects the raw API key back to the caller.
     """
     api_key_query = request.args.get('api_key')
     api_key_header = request.headers.get('X-API-Key')